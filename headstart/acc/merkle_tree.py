@@ -1,14 +1,17 @@
 from hashlib import sha256
 from headstart.abstract import AbstractAccumulator, AbstractUniversalAccumulator
+from concurrent.futures import Executor
 from typing import Optional
 from dataclasses import dataclass
-import bisect
+import bisect, struct
 
 
 class MerkleHash:
     # https://crypto.stackexchange.com/questions/2106/what-is-the-purpose-of-using-different-hash-functions-for-the-leaves-and-interna
     def __init__(self, hashfn):
         self.hashfn = hashfn
+        self.empty = [self.hash_leaf(b"")]
+        self.digest_size = len(self.empty[0])
 
     def hash_leaf(self, x: bytes) -> bytes:
         return self.hashfn(b"\x00" + x).digest()
@@ -16,8 +19,108 @@ class MerkleHash:
     def hash_node(self, x: bytes, y: bytes) -> bytes:
         return self.hashfn(b"\x01" + x + y).digest()
 
+    def hash_empty(self, level: int) -> bytes:
+        # root of a subtree made only of the b"" leaves MerkleTree.from_data pads with
+        while len(self.empty) <= level:
+            self.empty.append(self.hash_node(self.empty[-1], self.empty[-1]))
+        return self.empty[level]
+
+
+# Encoded inclusion proof: version, number of siblings k, sides (bit i set when the
+# i-th sibling is on the left), then the k sibling digests from the leaf up.
+PROOF_VERSION = 1
+PROOF_HEADER = struct.Struct(">BBQ")
+
+
+def encode_proof(proof: list[tuple[str, bytes]]) -> bytes:
+    sides = 0
+    for i, (side, _) in enumerate(proof):
+        if side == "L":
+            sides |= 1 << i
+    return PROOF_HEADER.pack(PROOF_VERSION, len(proof), sides) + b"".join(
+        h for _, h in proof
+    )
+
+
+def decode_proof(buf: bytes, digest_size: int) -> list[tuple[str, bytes]]:
+    version, k, sides = PROOF_HEADER.unpack_from(buf)
+    if version != PROOF_VERSION:
+        raise ValueError("unsupported proof version")
+    if len(buf) != PROOF_HEADER.size + k * digest_size:
+        raise ValueError("invalid proof")
+    buf = memoryview(buf)[PROOF_HEADER.size :]
+    return [
+        (
+            "L" if sides >> i & 1 else "R",
+            bytes(buf[i * digest_size : (i + 1) * digest_size]),
+        )
+        for i in range(k)
+    ]
+
+
+def proof_index(proof: list[tuple[str, bytes]]) -> int:
+    # leaf index of a proof of a padded tree
+    return sum(1 << i for i, (side, _) in enumerate(proof) if side == "L")
+
+
+def build_multiproof(sizes: list[int], node, indices: list[int]) -> list[bytes]:
+    # siblings needed to recompute the root from the leaves at `indices`, level by
+    # level from the leaves, skipping every node that can be computed instead
+    # sizes[h] is the number of nodes at height h, node(h, i) the i-th of them
+    known = sorted(set(indices))
+    if known and not (0 <= known[0] and known[-1] < sizes[0]):
+        raise ValueError("index out of range")
+    proof = []
+    for h, size in enumerate(sizes[:-1]):
+        parents = []
+        i = 0
+        while i < len(known):
+            index = known[i]
+            sibling = index ^ 1
+            if i + 1 < len(known) and known[i + 1] == sibling:
+                i += 2
+            else:
+                if sibling < size:  # otherwise the node was promoted
+                    proof.append(node(h, sibling))
+                i += 1
+            parents.append(index >> 1)
+        known = parents
+    return proof
+
+
+def _hash_subtree(H: MerkleHash, data: list[bytes]) -> list[bytes]:
+    # runs in a worker process of compute_levels_parallel
+    return UnbalancedMerkleTree.compute_levels(H, data)
+
+
+def compute_levels_parallel(
+    H: MerkleHash, data: list[bytes], executor: Executor, chunk_size=1 << 14
+) -> list[bytes]:
+    # Same levels as UnbalancedMerkleTree.compute_levels, and for a power of 2
+    # number of leaves as the padded tree. The leaves are split into aligned chunks
+    # of chunk_size (a power of 2) whose subtrees are hashed by the executor, only
+    # the levels above them are hashed here.
+    if chunk_size & (chunk_size - 1) != 0:
+        raise ValueError("chunk size must be a power of 2")
+    if len(data) <= chunk_size:
+        return UnbalancedMerkleTree.compute_levels(H, data)
+    futures = [
+        executor.submit(_hash_subtree, H, data[i : i + chunk_size])
+        for i in range(0, len(data), chunk_size)
+    ]
+    subtrees = [fut.result() for fut in futures]
+    # a lone last chunk smaller than chunk_size has fewer levels, its root is
+    # promoted up to the chunk roots
+    levels = [
+        b"".join(levels[min(h, len(levels) - 1)] for levels in subtrees)
+        for h in range(chunk_size.bit_length())
+    ]
+    return levels[:-1] + UnbalancedMerkleTree.hash_levels(H, levels[-1])
+
 
 class MerkleTree:
+    padded = True  # data is padded with b"" up to a power of 2
+
     def __init__(
         self,
         H: MerkleHash,
@@ -37,6 +140,12 @@ class MerkleTree:
     def root(self):
         return self.tree[0]
 
+    def node(self, i: int) -> bytes:
+        return self.tree[i]
+
+    def to_bytes(self) -> bytes:
+        return b"".join(self.tree)
+
     def verify_data(self):
         l = len(self.data)
         if l & (l - 1) != 0:
@@ -82,6 +191,69 @@ class MerkleTree:
                 raise ValueError("invalid proof")
         return x == root
 
+    @staticmethod
+    def check_encoded_proof(H: MerkleHash, root: bytes, x: bytes, proof: bytes):
+        # same as check_proof on decode_proof(proof), without building the list
+        return MerkleTree.encoded_proof_root(H, x, proof) == root
+
+    @staticmethod
+    def encoded_proof_root(H: MerkleHash, x: bytes, proof: bytes) -> bytes:
+        if len(proof) < PROOF_HEADER.size:
+            raise ValueError("invalid proof")
+        version, k, sides = PROOF_HEADER.unpack_from(proof)
+        if version != PROOF_VERSION:
+            raise ValueError("unsupported proof version")
+        d = H.digest_size
+        if len(proof) != PROOF_HEADER.size + k * d:
+            raise ValueError("invalid proof")
+        x = H.hash_leaf(x)
+        for pos in range(PROOF_HEADER.size, len(proof), d):
+            h = proof[pos : pos + d]
+            x = H.hash_node(h, x) if sides & 1 else H.hash_node(x, h)
+            sides >>= 1
+        return x
+
+    def get_multiproof(self, indices: list[int]) -> list[bytes]:
+        sizes = [self.lendata >> h for h in range(self.lendata.bit_length())]
+        return build_multiproof(
+            sizes, lambda h, i: self.node((self.lendata >> h) - 1 + i), indices
+        )
+
+    @staticmethod
+    def check_multiproof(
+        H: MerkleHash,
+        root: bytes,
+        sizes: list[int],
+        leaves: dict[int, bytes],
+        proof: list[bytes],
+    ):
+        # inverse of build_multiproof, leaves maps indices to data
+        if not leaves or not all(0 <= i < sizes[0] for i in leaves):
+            return False
+        known = {i: H.hash_leaf(x) for i, x in leaves.items()}
+        siblings = iter(proof)
+        for size in sizes[:-1]:
+            parents = {}
+            indices = sorted(known)
+            i = 0
+            while i < len(indices):
+                index = indices[i]
+                sibling = index ^ 1
+                x = known[index]
+                if i + 1 < len(indices) and indices[i + 1] == sibling:
+                    x = H.hash_node(x, known[sibling])
+                    i += 2
+                else:
+                    if sibling < size:
+                        h = next(siblings, None)
+                        if h is None:
+                            return False
+                        x = H.hash_node(h, x) if index & 1 else H.hash_node(x, h)
+                    i += 1
+                parents[index >> 1] = x
+            known = parents
+        return next(siblings, None) is None and known == {0: root}
+
     @staticmethod
     def compute_tree(H: MerkleHash, data: list[bytes]):
         l = len(data)
@@ -95,31 +267,387 @@ class MerkleTree:
         return tree
 
     @staticmethod
-    def from_data(H: MerkleHash, data: list[bytes]):
+    def tree_from_levels(H: MerkleHash, levels: list[bytes]) -> list[bytes]:
+        d = H.digest_size
+        return [
+            level[i : i + d]
+            for level in reversed(levels)
+            for i in range(0, len(level), d)
+        ]
+
+    @classmethod
+    def from_data(
+        cls, H: MerkleHash, data: list[bytes], executor: Optional[Executor] = None
+    ):
+        # with an executor, subtrees are hashed in parallel, see compute_levels_parallel
         data = list(data)
         l = len(data)
         if l & (l - 1) != 0:
             data.extend([b""] * (2 ** (l.bit_length()) - l))
-        tree = MerkleTree.compute_tree(H, data)
-        return MerkleTree(H, tree, data)
+        if executor is None:
+            tree = cls.compute_tree(H, data)
+        else:
+            tree = cls.tree_from_levels(H, compute_levels_parallel(H, data, executor))
+        return cls(H, tree, data)
+
+
+class CompactMerkleTree(MerkleTree):
+    # Same tree as MerkleTree, but every node lives in a single buffer of
+    # (2n - 1) * digest_size bytes instead of one bytes object per node. Any
+    # buffer works (bytearray, mmap, ...), nodes are returned as memoryview slices.
+    def __init__(
+        self,
+        H: MerkleHash,
+        tree,
+        data: Optional[list[bytes]] = None,
+        *,
+        verify_data=True
+    ):
+        self.H = H
+        self.tree = memoryview(tree)
+        self.lendata = (len(self.tree) // H.digest_size + 1) // 2
+        self.data = data
+        if data is not None and verify_data:
+            self.verify_data()
+
+    def node(self, i: int) -> memoryview:
+        d = self.H.digest_size
+        return self.tree[i * d : (i + 1) * d]
+
+    @property
+    def root(self):
+        return bytes(self.node(0))
+
+    def to_bytes(self) -> memoryview:
+        return self.tree
+
+    def verify_data(self):
+        l = len(self.data)
+        if l & (l - 1) != 0:
+            raise ValueError("data length must be a power of 2")
+        if self.lendata != l:
+            raise ValueError("tree length must be 2 * len(data) - 1")
+        if CompactMerkleTree.compute_tree(self.H, self.data) != self.tree:
+            raise ValueError("invalid tree")
+
+    def check_present(self, index: int, x: bytes):
+        x = self.H.hash_leaf(x)
+        cur = index + self.lendata - 1
+        while cur > 0:
+            if cur & 1:  # left
+                x = self.H.hash_node(x, self.node(cur + 1))
+            else:  # right
+                x = self.H.hash_node(self.node(cur - 1), x)
+            cur = (cur - 1) // 2
+        return x == self.root
+
+    def get_proof(self, index: int) -> list[tuple[str, memoryview]]:
+        d = self.H.digest_size
+        tree = self.tree
+        cur = index + self.lendata - 1
+        ret = []
+        while cur > 0:
+            if cur & 1:
+                ret.append(("R", tree[(cur + 1) * d : (cur + 2) * d]))
+            else:
+                ret.append(("L", tree[(cur - 1) * d : cur * d]))
+            cur = (cur - 1) // 2
+        return ret
+
+    @staticmethod
+    def tree_from_levels(H: MerkleHash, levels: list[bytes]) -> bytearray:
+        return bytearray().join(reversed(levels))
+
+    @staticmethod
+    def compute_tree(H: MerkleHash, data: list[bytes]) -> bytearray:
+        l = len(data)
+        if l & (l - 1) != 0:
+            raise ValueError("data length must be a power of 2")
+        # hashed level by level, each level is a single bytes object
+        d = H.digest_size
+        level = b"".join(map(H.hash_leaf, data))
+        levels = [level]
+        while len(level) > d:
+            level = b"".join(
+                [
+                    H.hash_node(level[i : i + d], level[i + d : i + 2 * d])
+                    for i in range(0, len(level), 2 * d)
+                ]
+            )
+            levels.append(level)
+        return bytearray().join(reversed(levels))
+
+
+class UnbalancedMerkleTree:
+    # RFC 6962 tree over exactly len(data) leaves: the left subtree is the largest
+    # full tree, or equivalently the lone last node of a level is promoted to the
+    # next one unchanged. Proofs skip those levels and still verify with
+    # MerkleTree.check_proof. levels[h] is the concatenation of the digests at
+    # height h, leaves first.
+    padded = False
+
+    def __init__(self, H: MerkleHash, levels: list, data: Optional[list[bytes]] = None):
+        self.H = H
+        self.levels = [memoryview(level) for level in levels]
+        self.lendata = len(self.levels[0]) // H.digest_size
+        self.data = data
+
+    @property
+    def root(self):
+        return bytes(self.levels[-1])
+
+    def to_bytes(self) -> bytes:
+        # root first, like the heap layout of a padded tree
+        return b"".join(reversed(self.levels))
+
+    @staticmethod
+    def level_sizes(n: int) -> list[int]:
+        sizes = [n]
+        while sizes[-1] > 1:
+            sizes.append((sizes[-1] + 1) // 2)
+        return sizes
+
+    @classmethod
+    def from_bytes(cls, H: MerkleHash, buf, n: int):
+        # inverse of to_bytes, buf can be a memoryview of an mmap
+        d = H.digest_size
+        levels = []
+        end = len(buf)
+        for size in cls.level_sizes(n):
+            levels.append(buf[end - size * d : end])
+            end -= size * d
+        return cls(H, levels)
+
+    def check_present(self, index: int, x: bytes):
+        return MerkleTree.check_proof(
+            self.H, self.root, x, index, self.get_proof(index)
+        )
+
+    def get_proof(self, index: int) -> list[tuple[str, memoryview]]:
+        d = self.H.digest_size
+        ret = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling * d < len(level):  # otherwise the node was promoted
+                side = "L" if index & 1 else "R"
+                ret.append((side, level[sibling * d : (sibling + 1) * d]))
+            index >>= 1
+        return ret
+
+    def get_multiproof(self, indices: list[int]) -> list[memoryview]:
+        d = self.H.digest_size
+        return build_multiproof(
+            UnbalancedMerkleTree.level_sizes(self.lendata),
+            lambda h, i: self.levels[h][i * d : (i + 1) * d],
+            indices,
+        )
+
+    @staticmethod
+    def compute_levels(H: MerkleHash, data: list[bytes]) -> list[bytes]:
+        if len(data) == 0:
+            raise ValueError("empty tree")
+        return UnbalancedMerkleTree.hash_levels(H, b"".join(map(H.hash_leaf, data)))
+
+    @staticmethod
+    def hash_levels(H: MerkleHash, level: bytes) -> list[bytes]:
+        # level and every level above it, up to the root
+        d = H.digest_size
+        levels = [level]
+        while len(level) > d:
+            nodes = [
+                H.hash_node(level[i : i + d], level[i + d : i + 2 * d])
+                for i in range(0, len(level) - d, 2 * d)
+            ]
+            if len(level) // d & 1:
+                nodes.append(level[-d:])
+            level = b"".join(nodes)
+            levels.append(level)
+        return levels
+
+    @classmethod
+    def from_data(
+        cls, H: MerkleHash, data: list[bytes], executor: Optional[Executor] = None
+    ):
+        if executor is None:
+            levels = cls.compute_levels(H, data)
+        else:
+            levels = compute_levels_parallel(H, data, executor)
+        return cls(H, levels, list(data))
+
+
+class IncrementalMerkleTree:
+    # Append-only version of MerkleTree.from_data: levels[h] keeps every completed
+    # node of height h, so each append hashes amortized O(1) nodes and finalize()
+    # only has to hash the O(log n) nodes on the right edge (padding included).
+    # The resulting root and proofs are identical to the padded MerkleTree, or to
+    # UnbalancedMerkleTree without padding.
+    def __init__(self, H: MerkleHash, padded=True):
+        self.H = H
+        self.padded = padded
+        self.levels: list[list[bytes]] = [[]]
+        self.size = 0
+        self.finalized = False
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def root(self):
+        if not self.finalized:
+            raise ValueError("tree is not finalized")
+        return self.levels[-1][0]
+
+    def append(self, x: bytes) -> int:
+        return self.append_hash(self.H.hash_leaf(x))
+
+    def append_hash(self, h: bytes) -> int:
+        # h = H.hash_leaf(x), so that leaves can be hashed outside of the tree
+        if self.finalized:
+            raise ValueError("tree is finalized")
+        index = self.size
+        self.size += 1
+        self.levels[0].append(h)
+        level, cur = 0, index
+        while cur & 1:
+            h = self.H.hash_node(self.levels[level][cur - 1], h)
+            level += 1
+            cur >>= 1
+            if len(self.levels) == level:
+                self.levels.append([])
+            self.levels[level].append(h)
+        return index
+
+    def finalize(self) -> bytes:
+        if self.finalized:
+            return self.root
+        if len(self) == 0:
+            raise ValueError("empty tree")
+        level = 0
+        while len(self.levels[level]) > 1:
+            nodes = self.levels[level]
+            if len(nodes) & 1 and self.padded:
+                nodes.append(self.H.hash_empty(level))
+            if len(self.levels) == level + 1:
+                self.levels.append([])
+            parents = self.levels[level + 1]
+            # only the right edge can be missing
+            if len(parents) < (len(nodes) + 1) // 2:
+                if len(nodes) & 1:
+                    parents.append(nodes[-1])  # promoted
+                else:
+                    parents.append(self.H.hash_node(nodes[-2], nodes[-1]))
+            level += 1
+        self.finalized = True
+        return self.root
+
+    def check_present(self, index: int, x: bytes):
+        return MerkleTree.check_proof(
+            self.H, self.root, x, index, self.get_proof(index)
+        )
+
+    def get_proof(self, index: int) -> list[tuple[str, bytes]]:
+        if not self.finalized:
+            raise ValueError("tree is not finalized")
+        ret = []
+        for nodes in self.levels[:-1]:
+            if index & 1:
+                ret.append(("L", nodes[index - 1]))
+            elif index + 1 < len(nodes):  # otherwise the node was promoted
+                ret.append(("R", nodes[index + 1]))
+            index >>= 1
+        return ret
+
+    def get_multiproof(self, indices: list[int]) -> list[bytes]:
+        if not self.finalized:
+            raise ValueError("tree is not finalized")
+        return build_multiproof(
+            [len(nodes) for nodes in self.levels],
+            lambda h, i: self.levels[h][i],
+            indices,
+        )
+
+    def to_bytes(self) -> bytes:
+        if not self.padded:
+            if not self.finalized:
+                raise ValueError("tree is not finalized")
+            return b"".join(b"".join(nodes) for nodes in reversed(self.levels))
+        return b"".join(self.to_tree())
+
+    def to_tree(self) -> list[bytes]:
+        # MerkleTree heap layout, with the subtrees made only of padding filled in
+        if not self.finalized:
+            raise ValueError("tree is not finalized")
+        if not self.padded:
+            raise ValueError("only padded trees have a heap layout")
+        depth = len(self.levels) - 1
+        tree = []
+        for level in range(depth, -1, -1):
+            nodes = self.levels[level]
+            tree.extend(nodes)
+            tree.extend(
+                [self.H.hash_empty(level)] * ((1 << depth - level) - len(nodes))
+            )
+        return tree
 
 
 class MerkleTreeAccumulator(
     AbstractAccumulator[MerkleTree, bytes, list[tuple[str, bytes]]]
 ):
-    def __init__(self, H: MerkleHash):
+    def __init__(
+        self,
+        H: MerkleHash,
+        compact=False,
+        balanced=True,
+        encode_proofs=False,
+        executor: Optional[Executor] = None,
+    ):
         self.H = H
+        # process pool building large trees in parallel, see compute_levels_parallel
+        self.executor = executor
+        self.balanced = balanced
+        # witnesses as bytes, see encode_proof, verify accepts both formats
+        self.encode_proofs = encode_proofs
+        # store the trees in a single buffer, see CompactMerkleTree
+        # unbalanced trees (UnbalancedMerkleTree) are always stored that way
+        if not balanced:
+            self.tree_cls = UnbalancedMerkleTree
+        else:
+            self.tree_cls = CompactMerkleTree if compact else MerkleTree
 
     def accumulate(self, X: list[bytes]) -> MerkleTree:
-        mkt = MerkleTree.from_data(self.H, X)
+        mkt = self.tree_cls.from_data(self.H, X, self.executor)
         return mkt
 
+    def incremental(self) -> IncrementalMerkleTree:
+        # same accumulation value and witnesses as accumulate(), built leaf by leaf
+        return IncrementalMerkleTree(self.H, padded=self.balanced)
+
     def witgen(self, mkt: MerkleTree, X: list[bytes], index: int):
+        if self.encode_proofs:
+            return encode_proof(mkt.get_proof(index))
         return mkt.get_proof(index)
 
-    def verify(self, root: bytes, w: list[tuple[str, bytes]], x: bytes):
+    def verify(self, root: bytes, w: list[tuple[str, bytes]] | bytes, x: bytes):
+        if isinstance(w, (bytes, bytearray, memoryview)):
+            return MerkleTree.check_encoded_proof(self.H, root, x, w)
         return MerkleTree.check_proof(self.H, root, x, 0, w)
 
+    def level_sizes(self, n: int) -> list[int]:
+        # shape of the tree over n data
+        if not self.balanced:
+            return UnbalancedMerkleTree.level_sizes(n)
+        N = 1 << (n - 1).bit_length()
+        return [N >> h for h in range(N.bit_length())]
+
+    def batch_witgen(self, mkt: MerkleTree, X: list[bytes], indices: list[int]):
+        return mkt.get_multiproof(indices)
+
+    def batch_verify(
+        self, root: bytes, n: int, w: list[bytes], items: dict[int, bytes]
+    ) -> bool:
+        # n is the number of data in the accumulator, items maps indices to data
+        return MerkleTree.check_multiproof(self.H, root, self.level_sizes(n), items, w)
+
     def get_accval(self, mkt: MerkleTree) -> bytes:
         return mkt.root
 
@@ -201,16 +729,8 @@ class SortedMerkleTreeAccumulator(
             if w.right
             else True
         )
-        li = (
-            int("".join([str(int(side == "L")) for side, _ in w.left[2]])[::-1], 2)
-            if w.left
-            else -1
-        )
-        ri = (
-            int("".join([str(int(side == "L")) for side, _ in w.right[2]])[::-1], 2)
-            if w.right
-            else -1
-        )
+        li = proof_index(w.left[2]) if w.left else -1
+        ri = proof_index(w.right[2]) if w.right else -1
         goodIndex = (
             (li + 1 == ri)
             or (ri == 0 and li == -1)
@@ -269,5 +789,123 @@ if __name__ == "__main__":
         w3 = acc.nonmemwitgen(accm, X, b"6")
         assert acc.nonmemverify(accval, w3, b"6")
 
+    def test3():
+        for n in range(1, 40):
+            X = [int2bytes(i) for i in range(n)]
+            mkt = MerkleTree.from_data(H, X)
+            imkt = IncrementalMerkleTree(H)
+            for x in X:
+                imkt.append(x)
+            assert imkt.finalize() == mkt.root
+            for i, x in enumerate(X):
+                assert imkt.get_proof(i) == mkt.get_proof(i)
+                assert imkt.check_present(i, x)
+            assert imkt.to_tree() == mkt.tree
+
+    def test4():
+        X = [int2bytes(i) for i in range(37)]
+        mkt = MerkleTree.from_data(H, X)
+        cmkt = CompactMerkleTree.from_data(H, X)
+        assert cmkt.root == mkt.root
+        assert cmkt.to_bytes() == mkt.to_bytes()
+        for i, x in enumerate(X):
+            assert cmkt.check_present(i, x)
+            assert cmkt.get_proof(i) == mkt.get_proof(i)
+            assert MerkleTree.check_proof(H, cmkt.root, x, i, cmkt.get_proof(i))
+
+    def test5():
+        def rfc6962_root(X):
+            if len(X) == 1:
+                return H.hash_leaf(X[0])
+            k = 1 << (len(X) - 1).bit_length() - 1
+            return H.hash_node(rfc6962_root(X[:k]), rfc6962_root(X[k:]))
+
+        acc = MerkleTreeAccumulator(H, balanced=False)
+        for n in range(1, 40):
+            X = [int2bytes(i) for i in range(n)]
+            mkt = acc.accumulate(X)
+            assert mkt.root == rfc6962_root(X)
+            imkt = acc.incremental()
+            for x in X:
+                imkt.append(x)
+            assert imkt.finalize() == mkt.root
+            assert imkt.to_bytes() == mkt.to_bytes()
+            mkt2 = UnbalancedMerkleTree.from_bytes(H, memoryview(mkt.to_bytes()), n)
+            for i, x in enumerate(X):
+                w = acc.witgen(mkt, X, i)
+                assert acc.verify(mkt.root, w, x)
+                assert imkt.get_proof(i) == w == mkt2.get_proof(i)
+                assert mkt.check_present(i, x)
+
+    def test6():
+        for acc in [
+            MerkleTreeAccumulator(H),
+            MerkleTreeAccumulator(H, compact=True),
+            MerkleTreeAccumulator(H, balanced=False),
+        ]:
+            for n in range(1, 20):
+                X = [int2bytes(i) for i in range(n)]
+                mkt = acc.accumulate(X)
+                imkt = acc.incremental()
+                for x in X:
+                    imkt.append(x)
+                imkt.finalize()
+                for indices in [[0], [n - 1], list(range(0, n, 3)), list(range(n))]:
+                    items = {i: X[i] for i in indices}
+                    w = acc.batch_witgen(mkt, X, indices)
+                    assert w == imkt.get_multiproof(indices)
+                    assert acc.batch_verify(mkt.root, n, w, items)
+                    if n > 1:
+                        bad = dict(items)
+                        bad[indices[0]] = b"bad"
+                        assert not acc.batch_verify(mkt.root, n, w, bad)
+                    if len(w) > 0:
+                        assert not acc.batch_verify(mkt.root, n, w[:-1], items)
+
+    def test7():
+        for acc in [
+            MerkleTreeAccumulator(H, encode_proofs=True),
+            MerkleTreeAccumulator(H, balanced=False, encode_proofs=True),
+        ]:
+            for n in range(1, 20):
+                X = [int2bytes(i) for i in range(n)]
+                mkt = acc.accumulate(X)
+                for i, x in enumerate(X):
+                    w = acc.witgen(mkt, X, i)
+                    assert len(w) == PROOF_HEADER.size + len(mkt.get_proof(i)) * 32
+                    assert decode_proof(w, 32) == mkt.get_proof(i)
+                    assert acc.verify(mkt.root, mkt.get_proof(i), x)
+                    assert acc.verify(mkt.root, w, x)
+                    assert not acc.verify(mkt.root, w, b"bad")
+                    if len(w) > PROOF_HEADER.size:
+                        assert proof_index(mkt.get_proof(i)) == i or not acc.balanced
+                        try:
+                            acc.verify(mkt.root, w[:-1], x)
+                            assert False
+                        except ValueError:
+                            pass
+
+    def test8():
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(4) as executor:
+            for n in [1, 7, 8, 9, 31, 32, 33, 100]:
+                X = [int2bytes(i) for i in range(n)]
+                for chunk_size in [1, 2, 4, 16]:
+                    levels = compute_levels_parallel(H, X, executor, chunk_size)
+                    assert levels == UnbalancedMerkleTree.compute_levels(H, X)
+                for cls in [MerkleTree, CompactMerkleTree, UnbalancedMerkleTree]:
+                    mkt = cls.from_data(H, X)
+                    assert cls.from_data(H, X, executor).to_bytes() == mkt.to_bytes()
+                    if cls.padded:
+                        levels = compute_levels_parallel(H, mkt.data, executor, 4)
+                        assert cls.tree_from_levels(H, levels) == mkt.tree
+
     test1()
     test2()
+    test3()
+    test4()
+    test5()
+    test6()
+    test7()
+    test8()
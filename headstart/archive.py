@@ -0,0 +1,132 @@
+from headstart.acc.merkle_tree import (
+    MerkleHash,
+    CompactMerkleTree,
+    UnbalancedMerkleTree,
+)
+from collections import OrderedDict
+from threading import Lock
+import os, mmap, struct
+
+# Archive file of a compacted stage, read through mmap without deserialization:
+#   header: magic, version, digest size, tree layout, number of contributions n,
+#           number of leaves N of the tree
+#   nodes: for a padded tree, (2N - 1) digests in the heap layout of
+#          MerkleTree.compute_tree, for an unbalanced one the levels of
+#          UnbalancedMerkleTree from the root down
+#   offsets: (n + 1) u64 offsets of the contributions, relative to the data
+#   data: the contributions concatenated
+# A proof only touches the pages holding its log(N) nodes.
+
+MAGIC = b"HSAR"
+VERSION = 1
+HEADER = struct.Struct(">4sBBBxQQ")
+HEAP, UNBALANCED = 0, 1  # tree layouts
+OFFSET = struct.Struct(">Q")
+
+
+class ArchivedTree:
+    # stands in for the MerkleTree of a compacted stage
+    def __init__(self, archive: "StageArchive", stage_idx: int):
+        self.archive = archive
+        self.stage_idx = stage_idx
+
+    def layout(self):
+        buf = self.archive.map(self.stage_idx)
+        magic, version, digest_size, layout, n, N = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("invalid stage archive")
+        if digest_size != self.archive.H.digest_size:
+            raise ValueError("digest size mismatch")
+        return memoryview(buf), digest_size, layout, n, N
+
+    def nodes_size(self, layout: int, N: int) -> int:
+        if layout == HEAP:
+            return 2 * N - 1
+        return sum(UnbalancedMerkleTree.level_sizes(N))
+
+    def tree(self):
+        buf, digest_size, layout, _, N = self.layout()
+        end = HEADER.size + self.nodes_size(layout, N) * digest_size
+        if layout == HEAP:
+            return CompactMerkleTree(self.archive.H, buf[HEADER.size : end])
+        return UnbalancedMerkleTree.from_bytes(
+            self.archive.H, buf[HEADER.size : end], N
+        )
+
+    @property
+    def root(self):
+        return self.tree().root
+
+    def get_proof(self, index: int) -> list[tuple[str, memoryview]]:
+        return self.tree().get_proof(index)
+
+    def get_multiproof(self, indices: list[int]) -> list[memoryview]:
+        return self.tree().get_multiproof(indices)
+
+    def get_data(self, index: int) -> bytes:
+        buf, digest_size, layout, n, N = self.layout()
+        table = HEADER.size + self.nodes_size(layout, N) * digest_size
+        (start,) = OFFSET.unpack_from(buf, table + index * OFFSET.size)
+        (end,) = OFFSET.unpack_from(buf, table + (index + 1) * OFFSET.size)
+        base = table + (n + 1) * OFFSET.size
+        return bytes(buf[base + start : base + end])
+
+
+class StageArchive:
+    # one archive file per compacted stage, the most recently used ones stay mapped
+    def __init__(self, directory: str, H: MerkleHash, max_mapped=64):
+        self.directory = os.path.join(directory, "archive")
+        os.makedirs(self.directory, exist_ok=True)
+        self.H = H
+        self.max_mapped = max_mapped
+        self.mapped: OrderedDict[int, mmap.mmap] = OrderedDict()
+        self.lock = Lock()
+
+    def path(self, stage_idx: int) -> str:
+        return os.path.join(self.directory, f"{stage_idx:010d}.stage")
+
+    def has(self, stage_idx: int) -> bool:
+        return os.path.exists(self.path(stage_idx))
+
+    def write(self, stage_idx: int, data: list[bytes], tree):
+        # tree: any of the merkle trees of the stage, finalized
+        digest_size = self.H.digest_size
+        nodes = tree.to_bytes()
+        if tree.padded:
+            layout, n_leaves = HEAP, (len(nodes) // digest_size + 1) // 2
+        else:
+            layout, n_leaves = UNBALANCED, len(data)
+        path = self.path(stage_idx)
+        with open(path + ".tmp", "wb") as f:
+            f.write(
+                HEADER.pack(MAGIC, VERSION, digest_size, layout, len(data), n_leaves)
+            )
+            f.write(nodes)
+            offset = 0
+            for x in data:
+                f.write(OFFSET.pack(offset))
+                offset += len(x)
+            f.write(OFFSET.pack(offset))
+            f.write(b"".join(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def map(self, stage_idx: int) -> mmap.mmap:
+        with self.lock:
+            buf = self.mapped.get(stage_idx)
+            if buf is not None:
+                self.mapped.move_to_end(stage_idx)
+                return buf
+            with open(self.path(stage_idx), "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped[stage_idx] = buf
+            if len(self.mapped) > self.max_mapped:
+                # not closed explicitly, proofs still being served may point into it
+                self.mapped.popitem(last=False)
+            return buf
+
+    def open(self, stage_idx: int) -> ArchivedTree:
+        if not self.has(stage_idx):
+            raise ValueError(f"stage {stage_idx} is not archived")
+        return ArchivedTree(self, stage_idx)
@@ -0,0 +1,262 @@
+from apscheduler.schedulers.background import BackgroundScheduler
+from headstart.stage import Stage, Phase, Parameters
+from headstart.wal import WriteAheadLog, SnapshotStore
+from headstart.archive import StageArchive
+from headstart.retention import RetentionPolicy
+from headstart.receipt import ReceiptSigner, batch_value
+import headstart.public_key as public_key
+import headstart.wal as wal
+import atexit, logging
+from typing import Optional
+
+
+class RandomnessBeacon:
+    def __init__(
+        self,
+        logger: logging.Logger,
+        priv_key: public_key.Ed25519PrivateKey,
+        state_dir: Optional[str] = None,
+    ):
+        self.logger = logger
+        self.stages: list[Stage] = []
+        self.interval_seconds = 3
+        self.W = 10
+        self.priv_key = priv_key
+        self.receipts = ReceiptSigner(priv_key)
+        # stages are only kept in memory without a state directory
+        self.wal: Optional[WriteAheadLog] = None
+        self.snapshots: Optional[SnapshotStore] = None
+        self.snapshot_every = 10
+        # compaction moves old stages to the archive, so it needs a state directory
+        self.archive: Optional[StageArchive] = None
+        self.retention = RetentionPolicy(window=self.W, min_age_seconds=60)
+        self.compacted_until = 0  # every stage before it is compacted
+        if state_dir is not None:
+            self.wal = WriteAheadLog(state_dir)
+            self.snapshots = SnapshotStore(state_dir)
+            self.archive = StageArchive(state_dir, Parameters.accumulator.H)
+            self.recover()
+        else:
+            self.add_stage(Stage())
+
+    @property
+    def current_stage(self):
+        return self.stages[-1]
+
+    @property
+    def current_stage_index(self):
+        return len(self.stages) - 1
+
+    def get_stage(self, stage_idx: int):
+        if not (0 <= stage_idx <= self.current_stage_index):
+            raise ValueError("invalid stage")
+        return self.stages[stage_idx]
+
+    def get_stage_after_phase(self, stage_idx: int, phase: Phase):
+        stage = self.get_stage(stage_idx)
+        if stage.phase < phase:
+            raise ValueError("not in correct phase")
+        return stage
+
+    def contribute(self, x: bytes):
+        stage_idx = self.current_stage_index
+        self.logger.debug(
+            f"Contribution received",
+            extra={"x": x.hex(), "stage": stage_idx},
+        )
+        data_idx = self.stages[stage_idx].contribute(x)
+        if self.wal is not None:
+            self.wal.append_contribution(stage_idx, data_idx, x)
+        sig, receipt = self.receipts.sign(x)
+        return stage_idx, data_idx, sig, receipt
+
+    def contribute_many(self, xs: list[bytes]):
+        # all of xs in the same stage, with a single receipt for batch_value(xs)
+        if not xs:
+            raise ValueError("no contributions")
+        stage_idx = self.current_stage_index
+        first_idx = self.stages[stage_idx].contribute_many(xs)
+        if self.wal is not None:
+            self.wal.append_contributions(stage_idx, first_idx, xs)
+        sig, receipt = self.receipts.sign(batch_value(xs))
+        return stage_idx, first_idx, first_idx + len(xs) - 1, sig, receipt
+
+    def next_stage(self):
+        self.logger.info(f"Starting next stage #{self.current_stage_index + 1}")
+        if self.wal is not None:
+            self.wal.append(self.current_stage_index, wal.CLOSE, sync=True)
+        self.current_stage.stop_contribution()
+        metrics = self.current_stage.metrics
+        self.logger.info(
+            f"Stage #{self.current_stage_index} closed in {metrics.close_seconds:.6f}s, "
+            f"{metrics.leaf_hash_seconds:.6f}s of hashing done beforehand"
+        )
+        prev_stages = self.stages[-self.W + 1 :]
+        self.add_stage(Stage(prev_stages))
+        if self.snapshots is not None:
+            self.snapshot()
+        if self.archive is not None:
+            self.compact()
+
+    def add_stage(self, stage: Stage, logged=Phase.CONTRIBUTION):
+        # `logged` is the last phase already in the log of a recovered stage
+        stage_idx = len(self.stages)
+        self.stages.append(stage)
+        if self.wal is not None:
+
+            def log_phase(stage: Stage, phase: Phase):
+                if logged >= phase:
+                    pass
+                elif phase == Phase.Y_READY:
+                    self.wal.append(stage_idx, wal.Y, stage.vdf_y, sync=True)
+                elif phase == Phase.DONE:
+                    self.wal.append(stage_idx, wal.PROOF, stage.vdf_proof, sync=True)
+                    self.wal.close_segment(stage_idx)
+
+            stage.phase_listeners.append(log_phase)
+
+    def snapshot(self):
+        # write the finalized stages that are not in a snapshot yet once there are
+        # enough of them, their log segments are not needed anymore after that
+        first = self.snapshots.last_stage + 1
+        last = first
+        while last < len(self.stages) and self.stages[last].phase >= Phase.DONE:
+            last += 1
+        if last - first < self.snapshot_every:
+            return
+        self.snapshots.write(
+            first, [self.stages[i].snapshot() for i in range(first, last)]
+        )
+        self.wal.drop(last - 1)
+        self.logger.info(f"Snapshot of stages #{first} to #{last - 1} written")
+
+    def compact(self):
+        expired = self.retention.expired(self.stages, self.compacted_until)
+        for stage_idx in expired:
+            stage = self.stages[stage_idx]
+            if not self.archive.has(stage_idx):
+                self.archive.write(stage_idx, stage.data, stage.get_acc())
+            stage.compact(self.archive.open(stage_idx))
+        while (
+            self.compacted_until < len(self.stages)
+            and self.stages[self.compacted_until].compacted
+        ):
+            self.compacted_until += 1
+        if expired:
+            self.logger.info(f"Compacted {len(expired)} stages")
+
+    def recover(self):
+        for stage_idx, state in enumerate(self.snapshots.load()):
+            stage = Stage.restore(self.stages[-self.W + 1 :], *state)
+            if self.archive.has(stage_idx):
+                stage.compact(self.archive.open(stage_idx))
+            self.add_stage(stage)
+        for stage_idx in self.wal.segments():
+            if stage_idx < len(self.stages):
+                continue  # already in a snapshot
+            if stage_idx != len(self.stages):
+                raise ValueError(f"missing log of stage {len(self.stages)}")
+            contributions: dict[int, bytes] = {}
+            closed, vdf_y, vdf_proof = False, None, None
+            for rtype, payload in self.wal.replay(stage_idx):
+                if rtype == wal.CONTRIBUTE:
+                    (data_idx,) = wal.INDEX.unpack_from(payload)
+                    contributions[data_idx] = payload[wal.INDEX.size :]
+                elif rtype == wal.CLOSE:
+                    closed = True
+                elif rtype == wal.Y:
+                    vdf_y = payload
+                elif rtype == wal.PROOF:
+                    vdf_proof = payload
+            stage = Stage(self.stages[-self.W + 1 :])
+            for data_idx in range(1, max(contributions, default=0) + 1):
+                # a hole is a contribution that was never acknowledged
+                stage.contribute(contributions.get(data_idx, b""))
+            if vdf_proof is not None:
+                logged = Phase.DONE
+            elif vdf_y is not None:
+                logged = Phase.Y_READY
+            else:
+                logged = Phase.EVALUATION if closed else Phase.CONTRIBUTION
+            self.add_stage(stage, logged)
+            if closed:
+                stage.stop_contribution(vdf_y, vdf_proof)
+        if not self.stages or self.current_stage.phase != Phase.CONTRIBUTION:
+            self.add_stage(Stage(self.stages[-self.W + 1 :]))
+        self.logger.info(f"Recovered {len(self.stages)} stages")
+
+    def register_scheduler(self):
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            func=self.next_stage, trigger="interval", seconds=self.interval_seconds
+        )
+        scheduler.start()
+        atexit.register(lambda: scheduler.shutdown())
+        atexit.register(lambda: Parameters.vdf_executor.shutdown(wait=False))
+        self.scheduler = scheduler
+
+    # everything below only returns plain data, so that it can be served to the
+    # http workers by headstart.core
+
+    def config(self):
+        return {
+            "interval_seconds": self.interval_seconds,
+            "window_size": self.W,
+        }
+
+    def info(self):
+        stage = self.current_stage
+        return {
+            "stage": self.current_stage_index,
+            "phase": stage.phase.name,
+            "contributions": len(stage),
+        }
+
+    def stage_info(self, idx: int):
+        if idx == -1:
+            # for client implementation convenience
+            return {
+                "stage": -1,
+                "phase": "DONE",
+                "contributions": 0,
+                "vdfy": b"",
+                "accval": b"",
+                "vdfchallenge": b"",
+                "vdfproof": b"",
+                "randomness": b"",
+            }
+        try:
+            stage = self.get_stage(idx)
+        except ValueError:
+            return {"stage": idx, "phase": "NONE", "contributions": 0}
+        ret = {
+            "stage": idx,
+            "phase": stage.phase.name,
+            "contributions": len(stage),
+        }
+        if stage.phase >= Phase.EVALUATION:
+            ret["accval"] = stage.get_acc_val()
+        if stage.phase >= Phase.Y_READY:
+            ret["vdfy"] = stage.get_final_y()
+        if stage.phase >= Phase.DONE:
+            ret["vdfproof"] = stage.get_vdf_proof()
+        return ret
+
+    def stage_infos(self, start_idx: int, end_idx: Optional[int] = None):
+        # inclusive
+        if end_idx is None:
+            end_idx = self.current_stage_index
+        return [self.stage_info(idx) for idx in range(start_idx, end_idx + 1)]
+
+    def acc_proof(self, stage_idx: int, data_idx: int):
+        stage = self.get_stage_after_phase(stage_idx, Phase.EVALUATION)
+        return stage.get_acc_proof(data_idx)
+
+    def acc_multiproof(self, stage_idx: int, data_indices: list[int]):
+        # one proof for many contributions of a stage, the verifier also needs the
+        # number of contributions to know the shape of the tree
+        stage = self.get_stage_after_phase(stage_idx, Phase.EVALUATION)
+        return {
+            "contributions": len(stage),
+            "hashes": [bytes(h) for h in stage.get_acc_multiproof(data_indices)],
+        }
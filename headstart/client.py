@@ -1,6 +1,7 @@
 from headstart.stage import Parameters, Phase, Stage
 from dataclasses import dataclass
 import httpx, base64, msgpack, time, headstart.public_key as public_key
+import headstart.receipt as receipt
 from cryptography.hazmat.primitives import serialization
 from typing import Optional
 
@@ -10,7 +11,8 @@ class Contribution:
     value: bytes
     stage: int
     data_index: int
-    signature: bytes
+    signature: bytes  # signature of the root of a batch of receipts
+    receipt: bytes  # inclusion proof of value in that batch
 
 
 @dataclass
@@ -47,20 +49,49 @@ class HeadStartClient:
     def get_info(self) -> StageInfo:
         return StageInfo(**msgpack.unpackb(self.client.get("/api/info").content))
 
-    def contribute(self, randomness: bytes) -> Contribution:
-        ct = Contribution(
-            value=randomness,
-            **msgpack.unpackb(
-                self.client.post(
-                    "/api/contribute",
-                    json={"randomness": base64.b64encode(randomness).decode()},
-                ).content
-            ),
-        )
-        if not public_key.verify(self.pub_key, ct.value, ct.signature):
+    def contribute(self, randomness: bytes, binary=True) -> Contribution:
+        # binary sends the raw bytes, otherwise base64 in json
+        if binary:
+            resp = self.client.post(
+                "/api/contribute",
+                content=randomness,
+                headers={"Content-Type": "application/octet-stream"},
+            )
+        else:
+            resp = self.client.post(
+                "/api/contribute",
+                json={"randomness": base64.b64encode(randomness).decode()},
+            )
+        ct = Contribution(value=randomness, **msgpack.unpackb(resp.content))
+        if not receipt.verify(self.pub_key, ct.value, ct.signature, ct.receipt):
             raise ValueError("invalid signature")
         return ct
 
+    def contribute_many(self, values: list[bytes]) -> list[Contribution]:
+        # one request and one receipt for all the values, the returned contributions
+        # share the signature and receipt of receipt.batch_value(values)
+        res = msgpack.unpackb(
+            self.client.post(
+                "/api/contribute_batch", content=msgpack.packb(values)
+            ).content
+        )
+        if res["end"] - res["start"] + 1 != len(values):
+            raise ValueError("invalid data index range")
+        if not receipt.verify(
+            self.pub_key, receipt.batch_value(values), res["signature"], res["receipt"]
+        ):
+            raise ValueError("invalid signature")
+        return [
+            Contribution(
+                value=x,
+                stage=res["stage"],
+                data_index=res["start"] + i,
+                signature=res["signature"],
+                receipt=res["receipt"],
+            )
+            for i, x in enumerate(values)
+        ]
+
     def get_stage(self, stage_idx: int) -> StageInfo:
         return StageInfo(
             **msgpack.unpackb(self.client.get(f"/api/stage/{stage_idx}").content)
@@ -91,6 +122,31 @@ class HeadStartClient:
             ).content
         )
 
+    def __accmultiproof(self, stage_idx: int, data_indices: list[int]):
+        return msgpack.unpackb(
+            self.client.post(
+                f"/api/stage/{stage_idx}/accmultiproof",
+                content=msgpack.packb(data_indices),
+            ).content
+        )
+
+    def verify_contributions(self, contributions: list[Contribution]):
+        # checks that all the contributions are in the accumulators of their stages,
+        # with a single proof per stage
+        by_stage: dict[int, list[Contribution]] = {}
+        for ct in contributions:
+            by_stage.setdefault(ct.stage, []).append(ct)
+        for stage_idx, cts in by_stage.items():
+            info = self.get_stage_until(stage_idx, Phase.EVALUATION)
+            res = self.__accmultiproof(stage_idx, [ct.data_index for ct in cts])
+            if not Parameters.accumulator.batch_verify(
+                info.accval,
+                res["contributions"],
+                res["hashes"],
+                {ct.data_index: ct.value for ct in cts},
+            ):
+                raise ValueError("accumulator verification failed")
+
     def __vdfproof(self, stage: int) -> bytes:
         return msgpack.unpackb(self.client.get(f"/api/stage/{stage}/vdfproof").content)
 
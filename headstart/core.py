@@ -0,0 +1,126 @@
+from headstart.beacon import RandomnessBeacon
+import headstart.public_key as public_key
+import socket, socketserver, struct, logging, argparse, os, msgpack
+
+# The beacon core is the single process owning the stages and the VDF pipeline.
+# HTTP workers are stateless and forward every beacon call to it over a unix
+# socket, each message being a 4-byte big-endian length followed by msgpack.
+
+DEFAULT_SOCKET = "/tmp/headstart.sock"
+
+# beacon methods the http workers are allowed to call
+EXPORTED = {
+    "config",
+    "info",
+    "contribute",
+    "contribute_many",
+    "stage_info",
+    "stage_infos",
+    "acc_proof",
+    "acc_multiproof",
+}
+
+# exceptions that are re-raised as-is on the worker side
+ERRORS = {"ValueError": ValueError}
+
+HEADER = struct.Struct(">I")
+
+
+def send_msg(sock: socket.socket, obj):
+    payload = msgpack.packb(obj)
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_msg(sock: socket.socket):
+    (n,) = HEADER.unpack(recv_exact(sock, HEADER.size))
+    return msgpack.unpackb(recv_exact(sock, n))
+
+
+class BeaconRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        beacon: RandomnessBeacon = self.server.beacon
+        while True:
+            try:
+                method, args = recv_msg(self.request)
+            except ConnectionError:
+                return
+            try:
+                if method not in EXPORTED:
+                    raise ValueError(f"unknown method {method}")
+                send_msg(self.request, {"result": getattr(beacon, method)(*args)})
+            except Exception as e:
+                send_msg(self.request, {"error": type(e).__name__, "message": str(e)})
+
+
+class BeaconCore(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, beacon: RandomnessBeacon):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, BeaconRequestHandler)
+        self.beacon = beacon
+
+
+class BeaconCoreClient:
+    # Drop-in replacement for RandomnessBeacon's plain data methods, used by the
+    # http workers. Connections are pooled and reused between calls.
+    def __init__(self, path: str = DEFAULT_SOCKET):
+        self.path = path
+        self.idle: list[socket.socket] = []
+
+    def connect(self) -> socket.socket:
+        try:
+            return self.idle.pop()
+        except IndexError:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            return sock
+
+    def call(self, method: str, *args):
+        sock = self.connect()
+        try:
+            send_msg(sock, (method, args))
+            resp = recv_msg(sock)
+        except:
+            sock.close()
+            raise
+        self.idle.append(sock)
+        if "error" in resp:
+            raise ERRORS.get(resp["error"], RuntimeError)(resp["message"])
+        return resp["result"]
+
+    def __getattr__(self, method: str):
+        if method not in EXPORTED:
+            raise AttributeError(method)
+        return lambda *args: self.call(method, *args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="unix socket path")
+    parser.add_argument("--private-key", default="priv.key")
+    parser.add_argument(
+        "--state-dir", default=None, help="persist the stages to this directory"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("headstart.core")
+    beacon = RandomnessBeacon(
+        logger, public_key.load_private_key(args.private_key), args.state_dir
+    )
+    beacon.register_scheduler()
+    with BeaconCore(args.socket, beacon) as core:
+        logger.info(f"Beacon core listening on {args.socket}")
+        core.serve_forever()
@@ -23,6 +23,11 @@ def verify(key: Ed25519PublicKey, data: bytes, signature: bytes) -> bool:
         return False
 
 
+def load_private_key(path: str) -> Ed25519PrivateKey:
+    with open(path, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=None)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("private_key", help="private key file destination")
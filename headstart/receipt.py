@@ -0,0 +1,89 @@
+from headstart.acc.merkle_tree import (
+    MerkleHash,
+    MerkleTree,
+    UnbalancedMerkleTree,
+    encode_proof,
+)
+from concurrent.futures import Future
+from hashlib import sha256
+from threading import Lock
+import headstart.public_key as public_key
+
+# Contribution receipts signed in batches: the contributions received while the
+# previous batch is being signed are put in a merkle tree whose root is signed once,
+# each contributor gets the signature and the encoded inclusion proof of its
+# contribution. A contribution arriving when no batch is in progress is signed
+# right away, so batches only grow under load.
+
+H = MerkleHash(sha256)
+DOMAIN = b"headstart receipt\x00"  # a signed root can't be mistaken for other data
+
+
+class ReceiptSigner:
+    def __init__(self, priv_key: public_key.Ed25519PrivateKey, max_batch=1024):
+        self.priv_key = priv_key
+        self.max_batch = max_batch
+        self.lock = Lock()
+        self.pending: list[tuple[bytes, Future]] = []
+        self.signing = False  # a caller is signing batches
+
+    def sign(self, x: bytes) -> tuple[bytes, bytes]:
+        # returns (signature, proof)
+        fut = Future()
+        with self.lock:
+            self.pending.append((x, fut))
+            if self.signing:
+                lead = False
+            else:
+                lead = self.signing = True
+        if lead:
+            # sign batches until nobody is waiting anymore
+            while True:
+                with self.lock:
+                    batch = self.pending[: self.max_batch]
+                    del self.pending[: self.max_batch]
+                    if not batch:
+                        self.signing = False
+                        break
+                self.sign_batch(batch)
+        return fut.result()
+
+    def sign_batch(self, batch: list[tuple[bytes, Future]]):
+        try:
+            tree = UnbalancedMerkleTree.from_data(H, [x for x, _ in batch])
+            signature = public_key.sign(self.priv_key, DOMAIN + tree.root)
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for i, (_, fut) in enumerate(batch):
+            fut.set_result((signature, encode_proof(tree.get_proof(i))))
+
+
+def batch_value(xs: list[bytes]) -> bytes:
+    # what the receipt of a batch of contributions is about
+    return UnbalancedMerkleTree.from_data(H, xs).root
+
+
+def verify(
+    pub_key: public_key.Ed25519PublicKey, x: bytes, signature: bytes, proof: bytes
+) -> bool:
+    try:
+        root = MerkleTree.encoded_proof_root(H, x, proof)
+    except (ValueError, IndexError):
+        return False
+    return public_key.verify(pub_key, DOMAIN + root, signature)
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    priv_key = public_key.Ed25519PrivateKey.generate()
+    signer = ReceiptSigner(priv_key)
+    X = [bytes([i]) * 8 for i in range(100)]
+    with ThreadPoolExecutor(16) as pool:
+        receipts = list(pool.map(signer.sign, X))
+    for x, (sig, proof) in zip(X, receipts):
+        assert verify(priv_key.public_key(), x, sig, proof)
+        assert not verify(priv_key.public_key(), x + b"!", sig, proof)
+    assert not verify(priv_key.public_key(), X[0], receipts[0][0], b"")
@@ -0,0 +1,23 @@
+from headstart.stage import Stage, Phase
+from dataclasses import dataclass
+import time
+
+
+@dataclass
+class RetentionPolicy:
+    # finalized stages older than both bounds are compacted, the last `window`
+    # stages are always kept in memory since new stages aggregate over them
+    window: int
+    min_age_seconds: float
+
+    def expired(self, stages: list[Stage], first=0, now=None) -> list[int]:
+        # stages before `first` are known to be compacted already
+        now = time.time() if now is None else now
+        ret = []
+        for stage_idx in range(first, len(stages) - self.window):
+            stage = stages[stage_idx]
+            if stage.compacted or stage.phase < Phase.DONE:
+                continue
+            if now - stage.phase_times.get(Phase.DONE, 0.0) >= self.min_age_seconds:
+                ret.append(stage_idx)
+        return ret
@@ -1,72 +1,15 @@
 from flask import Flask, request, make_response
 from werkzeug.exceptions import HTTPException
 from flask.json.provider import JSONProvider
-from apscheduler.schedulers.background import BackgroundScheduler
-import atexit, logging, base64, json, msgpack
-from headstart.stage import Stage, Phase
+import logging, base64, json, os, msgpack
+from headstart.core import BeaconCoreClient
 import headstart.public_key as public_key
-from cryptography.hazmat.primitives import serialization
 
 
-with open("priv.key", "rb") as f:
-    priv_key = serialization.load_pem_private_key(f.read(), password=None, backend=None)
 with open("pub.key", "rb") as f:
     public_bytes = f.read()
 
 
-class RandomnessBeacon:
-    def __init__(self, logger: logging.Logger, priv_key: public_key.Ed25519PrivateKey):
-        self.logger = logger
-        self.stages: list[Stage] = [Stage()]
-        self.interval_seconds = 3
-        self.W = 10
-        self.priv_key = priv_key
-
-    @property
-    def current_stage(self):
-        return self.stages[-1]
-
-    @property
-    def current_stage_index(self):
-        return len(self.stages) - 1
-
-    def get_stage(self, stage_idx: int):
-        if not (0 <= stage_idx <= self.current_stage_index):
-            raise ValueError("invalid stage")
-        return self.stages[stage_idx]
-
-    def get_stage_after_phase(self, stage_idx: int, phase: Phase):
-        stage = self.get_stage(stage_idx)
-        if stage.phase < phase:
-            raise ValueError("not in correct phase")
-        return stage
-
-    def contribute(self, x: bytes):
-        self.logger.debug(
-            f"Contribution received",
-            extra={"x": x.hex(), "stage": self.current_stage_index},
-        )
-        data_idx = self.current_stage.contribute(x)
-        stage_idx = self.current_stage_index
-        sig = public_key.sign(self.priv_key, x)
-        return stage_idx, data_idx, sig
-
-    def next_stage(self):
-        self.logger.info(f"Starting next stage #{self.current_stage_index + 1}")
-        self.current_stage.stop_contribution()
-        prev_stages = self.stages[-self.W + 1 :]
-        self.stages.append(Stage(prev_stages))
-
-    def register_scheduler(self):
-        scheduler = BackgroundScheduler()
-        scheduler.add_job(
-            func=self.next_stage, trigger="interval", seconds=self.interval_seconds
-        )
-        scheduler.start()
-        atexit.register(lambda: scheduler.shutdown())
-        self.scheduler = scheduler
-
-
 def msgpackify(obj):
     resp = make_response(msgpack.packb(obj))
     resp.headers["Content-Type"] = "application/msgpack"
@@ -94,8 +37,15 @@ def handle_exception(e):
     return response
 
 
-beacon = RandomnessBeacon(app.logger, priv_key)
-beacon.register_scheduler()
+if "HEADSTART_CORE_SOCKET" in os.environ:
+    # stateless worker, the stages live in the beacon core process (headstart.core)
+    beacon = BeaconCoreClient(os.environ["HEADSTART_CORE_SOCKET"])
+else:
+    # single process mode, only valid with a single gunicorn worker
+    from headstart.beacon import RandomnessBeacon
+
+    beacon = RandomnessBeacon(app.logger, public_key.load_private_key("priv.key"))
+    beacon.register_scheduler()
 
 
 @app.get("/api/pubkey")
@@ -107,84 +57,94 @@ def pubkey():
 
 @app.get("/api/beacon_config")
 def beacon_config():
-    return msgpackify(
-        {
-            "interval_seconds": beacon.interval_seconds,
-            "window_size": beacon.W,
-        }
-    )
+    return msgpackify(beacon.config())
 
 
 @app.get("/api/info")
 def info():
-    return msgpackify(
-        {
-            "stage": beacon.current_stage_index,
-            "phase": beacon.current_stage.phase.name,
-            "contributions": len(beacon.current_stage.data),
-        }
-    )
+    return msgpackify(beacon.info())
 
 
 @app.post("/api/contribute")
 def contribute():
+    # the randomness as the raw body (application/octet-stream), as a msgpack byte
+    # string (application/msgpack) or base64 encoded in {"randomness": ...} (json)
     try:
-        x = base64.b64decode(request.json["randomness"])
+        if request.mimetype == "application/octet-stream":
+            x = request.get_data()
+        elif request.mimetype == "application/msgpack":
+            x = msgpack.unpackb(request.get_data())
+            if not isinstance(x, bytes):
+                raise ValueError
+        else:
+            x = base64.b64decode(request.json["randomness"])
     except:
         return (
             msgpackify(
-                {"error": "no randomness provided or randomness isn't base64 encoded"}
+                {"error": "no randomness provided or randomness isn't properly encoded"}
             ),
             400,
         )
-    stage_idx, data_idx, sig = beacon.contribute(x)
-    return msgpackify({"stage": stage_idx, "data_index": data_idx, "signature": sig})
-
-
-def get_stage(idx):
-    if idx == -1:
-        # for client implementation convenience
-        return {
-            "stage": -1,
-            "phase": "DONE",
-            "contributions": 0,
-            "vdfy": b"",
-            "accval": b"",
-            "vdfchallenge": b"",
-            "vdfproof": b"",
-            "randomness": b"",
+    stage_idx, data_idx, sig, receipt = beacon.contribute(x)
+    return msgpackify(
+        {
+            "stage": stage_idx,
+            "data_index": data_idx,
+            "signature": sig,
+            "receipt": receipt,
         }
+    )
+
+
+@app.post("/api/contribute_batch")
+def contribute_batch():
+    # body: msgpack array of the contributions, for proxies relaying many of them
     try:
-        stage = beacon.get_stage(idx)
-    except ValueError:
-        return {"stage": idx, "phase": "NONE", "contributions": 0}
-    ret = {
-        "stage": idx,
-        "phase": stage.phase.name,
-        "contributions": len(stage.data),
-    }
-    if stage.phase >= Phase.EVALUATION:
-        ret["accval"] = stage.get_acc_val()
-    if stage.phase >= Phase.DONE:
-        ret["vdfy"] = stage.get_final_y()
-        ret["vdfproof"] = stage.get_vdf_proof()
-    return ret
+        xs = msgpack.unpackb(request.get_data())
+        if not xs or not all(isinstance(x, bytes) for x in xs):
+            raise ValueError
+    except:
+        return msgpackify({"error": "expected a msgpack array of byte strings"}), 400
+    stage_idx, start_idx, end_idx, sig, receipt = beacon.contribute_many(xs)
+    return msgpackify(
+        {
+            "stage": stage_idx,
+            "start": start_idx,  # inclusive
+            "end": end_idx,
+            "signature": sig,
+            "receipt": receipt,
+        }
+    )
 
 
 @app.get("/api/stage")
 def stages():
     # inclusive
     start_idx = int(request.args.get("start", 0))
-    end_idx = int(request.args.get("end", beacon.current_stage_index))
-    return msgpackify([get_stage(idx) for idx in range(start_idx, end_idx + 1)])
+    end_idx = request.args.get("end", None, type=int)
+    return msgpackify(beacon.stage_infos(start_idx, end_idx))
 
 
 @app.get("/api/stage/<int:stage_idx>")
 def stage(stage_idx):
-    return msgpackify(get_stage(stage_idx))
+    return msgpackify(beacon.stage_info(stage_idx))
 
 
 @app.get("/api/stage/<int:stage_idx>/accproof/<int:data_idx>")
 def accproof(stage_idx, data_idx):
-    stage = beacon.get_stage_after_phase(stage_idx, Phase.EVALUATION)
-    return msgpackify(stage.get_acc_proof(data_idx))
+    return msgpackify(beacon.acc_proof(stage_idx, data_idx))
+
+
+@app.post("/api/stage/<int:stage_idx>/accmultiproof")
+def accmultiproof(stage_idx):
+    # body: msgpack array of data indices
+    try:
+        data_indices = msgpack.unpackb(request.get_data())
+        if not all(isinstance(i, int) for i in data_indices):
+            raise ValueError
+    except:
+        return msgpackify({"error": "expected a msgpack array of data indices"}), 400
+    try:
+        return msgpackify(beacon.acc_multiproof(stage_idx, data_indices))
+    except ValueError as e:
+        return msgpackify({"error": str(e)}), 400
@@ -1,11 +1,15 @@
 from headstart.acc.merkle_tree import MerkleHash, MerkleTreeAccumulator
 from headstart.abstract import AggregateVDF
 from headstart.vdf.chia_vdf import SerializableChiaVDF, AggregateChiaVDF
+from headstart.vdf.executor import VDFExecutor
+from concurrent.futures import Future, CancelledError
+from dataclasses import dataclass
 from hashlib import sha256
 from enum import Enum
-from threading import Thread, Lock
+from queue import SimpleQueue
+from threading import Thread, Lock, Condition
 import sys, os, random, time
-from typing import Optional
+from typing import Optional, Callable
 
 # This implements https://www.ndss-symposium.org/wp-content/uploads/2022-234-paper.pdf special case L=1
 
@@ -14,7 +18,9 @@ class Phase(Enum):
     NONE = 0
     CONTRIBUTION = 1
     EVALUATION = 2
-    DONE = 3
+    Y_READY = 3  # y is known, the aggregate proof is still being computed
+    DONE = 4
+    PROOF_READY = 4  # alias of DONE
 
     def __lt__(self, other):
         return self.value < other.value
@@ -24,17 +30,32 @@ class Phase(Enum):
 
 
 class Parameters:
-    accumulator = MerkleTreeAccumulator(MerkleHash(sha256))
+    # unbalanced tree, no padding up to the next power of two
+    accumulator = MerkleTreeAccumulator(
+        MerkleHash(sha256), balanced=False, encode_proofs=True
+    )
     T = 2**10
     bits = 256
     # vdf = SerializableChiaVDF(bits, T)
     avdf = AggregateChiaVDF(bits, T)
+    vdf_executor = VDFExecutor(avdf)
+    # hash the contributions on a background thread instead of the request thread
+    hash_worker = False
 
     @staticmethod
     def hash(y: bytes):
         return sha256(y).digest()
 
 
+@dataclass
+class StageMetrics:
+    # time spent hashing the tree while contributions arrive, which closing the
+    # stage would otherwise have to spend at once
+    leaf_hash_seconds: float = 0.0
+    # time spent finishing the tree when the stage closes
+    close_seconds: float = 0.0
+
+
 class VDFComputation:
     def __init__(self, vdf: AggregateVDF, challenge: bytes):
         self.vdf = vdf
@@ -58,49 +79,219 @@ class VDFComputation:
 class Stage:
     def __init__(self, prev_stages: list["Stage"] = []):
         self.data: list[bytes] = [b"DUMMY VALUE"]  # to prevent some errors
+        # the tree is built while contributions arrive, so closing the stage only
+        # has to hash the right edge of the tree
+        self.acc = Parameters.accumulator.incremental()
+        self.acc.append(self.data[0])
+        self.acc_lock = Lock()
+        self.data_lock = Lock()  # keeps the tree in the same order as data
+        self.metrics = StageMetrics()
+        self.hash_queue: Optional[SimpleQueue] = None
+        if Parameters.hash_worker:
+            self.hash_queue = SimpleQueue()
+            self.hash_thread = Thread(target=self.hash_run, daemon=True)
+            self.hash_thread.start()
         self.phase = Phase.CONTRIBUTION
+        self.phase_times = {Phase.CONTRIBUTION: time.time()}
+        self.phase_changed = Condition()
+        # called with (stage, phase) on every phase change
+        self.phase_listeners: list[Callable[["Stage", Phase], None]] = []
         self.prev_stages = prev_stages
+        self.vdf_job: Optional[Future] = None
+        self.vdf_y: Optional[bytes] = None
+        self.vdf_proof: Optional[bytes] = None
+
+    def __len__(self):
+        # number of contributions, including the dummy one
+        return len(self.data) if self.data is not None else self.size
+
+    @property
+    def compacted(self):
+        return self.data is None
+
+    @staticmethod
+    def restore(
+        prev_stages: list["Stage"],
+        data: Optional[list[bytes]],
+        size: int,
+        accval: bytes,
+        vdf_challenge: bytes,
+        vdf_y: bytes,
+        vdf_proof: bytes,
+        acc=None,
+    ) -> "Stage":
+        # a finalized stage from Stage.snapshot(), without acc its tree is only
+        # rebuilt from data once a proof is requested
+        stage = Stage(prev_stages)
+        if stage.hash_queue is not None:
+            stage.hash_queue.put(None)  # nothing left to hash
+        stage.data = data
+        stage.size = size
+        stage.acc = acc
+        stage.accval = accval
+        stage.vdf_challenge = vdf_challenge
+        stage.vdf_y = vdf_y
+        stage.vdf_proof = vdf_proof
+        stage.phase = Phase.DONE
+        return stage
+
+    def snapshot(self) -> list:
+        if self.phase < Phase.DONE:
+            raise ValueError("not in done phase")
+        return [
+            self.data,
+            len(self),
+            self.accval,
+            self.vdf_challenge,
+            self.vdf_y,
+            self.vdf_proof,
+        ]
+
+    def compact(self, acc):
+        # drop the contributions and the tree, `acc` answers the proofs from now on
+        if self.phase < Phase.DONE:
+            raise ValueError("not in done phase")
+        with self.acc_lock:
+            self.size = len(self)
+            self.acc = acc
+            self.data = None
 
     def contribute(self, x: bytes):
-        if self.phase != Phase.CONTRIBUTION:
-            raise ValueError("not in contribution phase")
-        self.data.append(x)
-        return len(self.data) - 1  # index of x in the data
-
-    def stop_contribution(self):
-        if self.phase != Phase.CONTRIBUTION:
-            raise ValueError("not in contribution phase")
-        self.phase = Phase.EVALUATION
-        self.acc = Parameters.accumulator.accumulate(self.data)
+        if self.hash_queue is not None:
+            with self.data_lock:
+                if self.phase != Phase.CONTRIBUTION:
+                    raise ValueError("not in contribution phase")
+                self.data.append(x)
+                self.hash_queue.put(x)
+                return len(self.data) - 1  # index of x in the data
+        start = time.perf_counter()
+        h = Parameters.accumulator.H.hash_leaf(x)
+        with self.data_lock:
+            if self.phase != Phase.CONTRIBUTION:
+                raise ValueError("not in contribution phase")
+            self.data.append(x)
+            self.acc.append_hash(h)
+            self.metrics.leaf_hash_seconds += time.perf_counter() - start
+            return len(self.data) - 1
+
+    def contribute_many(self, xs: list[bytes]) -> int:
+        # xs get contiguous indices, returns the first one
+        hashes = None
+        if self.hash_queue is None:
+            start = time.perf_counter()
+            hashes = list(map(Parameters.accumulator.H.hash_leaf, xs))
+        with self.data_lock:
+            if self.phase != Phase.CONTRIBUTION:
+                raise ValueError("not in contribution phase")
+            first = len(self.data)
+            self.data.extend(xs)
+            if hashes is None:
+                for x in xs:
+                    self.hash_queue.put(x)
+            else:
+                for h in hashes:
+                    self.acc.append_hash(h)
+                self.metrics.leaf_hash_seconds += time.perf_counter() - start
+            return first
+
+    def hash_run(self):
+        while (x := self.hash_queue.get()) is not None:
+            start = time.perf_counter()
+            self.acc.append(x)
+            self.metrics.leaf_hash_seconds += time.perf_counter() - start
+
+    def set_phase(self, phase: Phase):
+        with self.phase_changed:
+            self.phase = phase
+            self.phase_times[phase] = time.time()
+            self.phase_changed.notify_all()
+        for listener in self.phase_listeners:
+            listener(self, phase)
+
+    def wait_phase(self, phase: Phase, timeout: Optional[float] = None) -> bool:
+        with self.phase_changed:
+            return self.phase_changed.wait_for(lambda: self.phase >= phase, timeout)
+
+    def stop_contribution(
+        self, vdf_y: Optional[bytes] = None, vdf_proof: Optional[bytes] = None
+    ):
+        # vdf_y and vdf_proof are only known when resuming a stage from the log
+        with self.data_lock:
+            if self.phase != Phase.CONTRIBUTION:
+                raise ValueError("not in contribution phase")
+            self.set_phase(Phase.EVALUATION)
+        start = time.perf_counter()
+        if self.hash_queue is not None:
+            self.hash_queue.put(None)
+            self.hash_thread.join()
+        self.acc.finalize()
+        self.metrics.close_seconds = time.perf_counter() - start
+        self.accval = Parameters.accumulator.get_accval(self.acc)
+        self.vdf_y = vdf_y
+        self.vdf_proof = vdf_proof
+        self.vdf_thread = Thread(target=self.vdf_run)
+        self.vdf_thread.start()
+
+    def vdf_run(self):
         if len(self.prev_stages) == 0:
             prev_stage_y = b""
         else:
+            # the chain only needs the previous y, not its aggregate proof
             prev = self.prev_stages[-1]
-            while prev.phase < Phase.DONE:
-                time.sleep(1)
+            prev.wait_phase(Phase.Y_READY)
             prev_stage_y = prev.get_final_y()
         self.vdf_challenge = Parameters.hash(self.get_acc_val() + prev_stage_y)
-        self.vdf_thread = Thread(target=self.vdf_run)
-        self.vdf_thread.start()
-
-    def vdf_run(self):
-        self.vdf_y = Parameters.avdf.eval([self.vdf_challenge])[0]
+        if self.vdf_y is None:
+            self.vdf_job = Parameters.vdf_executor.submit_eval(self.vdf_challenge)
+            try:
+                self.vdf_y = self.vdf_job.result()
+            except CancelledError:
+                return
+        self.set_phase(Phase.Y_READY)
+        if self.vdf_proof is not None:
+            self.set_phase(Phase.DONE)
+            return
+        # every previous stage is at least Y_READY since the chain is sequential
         prev_challenges = [stage.vdf_challenge for stage in self.prev_stages]
         prev_ys = [stage.vdf_y for stage in self.prev_stages]
-        self.vdf_proof = Parameters.avdf.aggregate(
+        self.vdf_job = Parameters.vdf_executor.submit_aggregate(
             prev_challenges + [self.vdf_challenge], prev_ys + [self.vdf_y]
         )
-        self.phase = Phase.DONE
+        self.vdf_job.add_done_callback(self.on_vdf_proof)
+
+    def on_vdf_proof(self, job: Future):
+        if job.cancelled():
+            return
+        self.vdf_proof = job.result()
+        self.set_phase(Phase.DONE)
+
+    def cancel(self):
+        # only pending jobs are cancelled, a running evaluation finishes anyway
+        if self.vdf_job is not None:
+            self.vdf_job.cancel()
 
     def get_acc_val(self):
         if self.phase < Phase.EVALUATION:
             raise ValueError("not in evaluation phase")
-        return Parameters.accumulator.get_accval(self.acc)
+        return self.accval
+
+    def get_acc(self):
+        with self.acc_lock:
+            if self.acc is None:
+                self.acc = Parameters.accumulator.accumulate(self.data)
+            return self.acc
 
     def get_acc_proof(self, data_index: int):
         if self.phase < Phase.EVALUATION:
             raise ValueError("not in evaluation phase")
-        return Parameters.accumulator.witgen(self.acc, self.data, data_index)
+        return Parameters.accumulator.witgen(self.get_acc(), self.data, data_index)
+
+    def get_acc_multiproof(self, data_indices: list[int]):
+        if self.phase < Phase.EVALUATION:
+            raise ValueError("not in evaluation phase")
+        return Parameters.accumulator.batch_witgen(
+            self.get_acc(), self.data, data_indices
+        )
 
     def get_vdf_proof(self):
         if self.phase < Phase.DONE:
@@ -108,6 +299,6 @@ class Stage:
         return self.vdf_proof
 
     def get_final_y(self):
-        if self.phase < Phase.DONE:
-            raise ValueError("not in done phase")
+        if self.phase < Phase.Y_READY:
+            raise ValueError("y is not ready yet")
         return self.vdf_y
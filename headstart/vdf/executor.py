@@ -0,0 +1,90 @@
+from concurrent.futures import ProcessPoolExecutor, Future
+from headstart.abstract import AggregateVDF
+from threading import Lock
+from typing import Optional
+import multiprocessing
+
+# set by _init_worker in every worker process
+_avdf: Optional[AggregateVDF] = None
+
+
+def _init_worker(avdf: AggregateVDF):
+    global _avdf
+    _avdf = avdf
+
+
+def _eval(challenge: bytes) -> bytes:
+    return _avdf.eval([challenge])[0]
+
+
+def _aggregate(challenges: list[bytes], ys: list[bytes]) -> bytes:
+    return _avdf.aggregate(challenges, ys)
+
+
+class VDFExecutor:
+    # Runs AggregateVDF jobs in worker processes so that long evaluations never
+    # compete with request handling, jobs are returned as cancellable futures.
+    def __init__(self, avdf: AggregateVDF, max_workers: Optional[int] = None):
+        self.avdf = avdf
+        self.max_workers = max_workers
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = Lock()
+        self.jobs: set[Future] = set()
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        # created lazily so that the pool belongs to the process actually using it
+        # spawn instead of fork, the parent may be running gevent or scheduler threads
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(
+                    self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.avdf,),
+                )
+            return self.pool
+
+    def submit(self, fn, *args) -> Future:
+        fut = self.get_pool().submit(fn, *args)
+        with self.lock:
+            self.jobs.add(fut)
+        fut.add_done_callback(self.forget)
+        return fut
+
+    def forget(self, fut: Future):
+        with self.lock:
+            self.jobs.discard(fut)
+
+    def submit_eval(self, challenge: bytes) -> "Future[bytes]":
+        return self.submit(_eval, challenge)
+
+    def submit_aggregate(
+        self, challenges: list[bytes], ys: list[bytes]
+    ) -> "Future[bytes]":
+        return self.submit(_aggregate, challenges, ys)
+
+    def cancel_all(self):
+        # jobs already running in a worker can't be interrupted and will finish
+        with self.lock:
+            jobs = list(self.jobs)
+        for fut in jobs:
+            fut.cancel()
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    from headstart.vdf.chia_vdf import AggregateChiaVDF
+
+    avdf = AggregateChiaVDF(1024, 1 << 16)
+    executor = VDFExecutor(avdf, 2)
+    challenges = [b"peko", b"peko2", b"peko3"]
+    ys = [f.result() for f in [executor.submit_eval(c) for c in challenges]]
+    assert ys == avdf.eval(challenges)
+    pi = executor.submit_aggregate(challenges, ys).result()
+    assert avdf.verify(challenges, ys, pi)
+    executor.shutdown()
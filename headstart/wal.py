@@ -0,0 +1,159 @@
+from threading import Lock
+from typing import BinaryIO
+import os, struct, zlib, msgpack
+
+# Durable beacon state: an append-only binary log per stage holding its
+# contributions and phase transitions, and snapshots of finalized stages written
+# in chunks. A restart loads the snapshots and replays only the logs of the stages
+# that are not in a snapshot yet.
+
+# record types
+CONTRIBUTE = 1  # payload: data index (u32) + contribution
+CLOSE = 2  # payload: empty
+Y = 3  # payload: vdf y
+PROOF = 4  # payload: aggregate vdf proof
+
+RECORD_HEADER = struct.Struct(">BI")  # record type, payload length
+CRC = struct.Struct(">I")  # crc32 of header + payload
+INDEX = struct.Struct(">I")
+
+SNAPSHOT_VERSION = 1
+
+
+def encode_record(rtype: int, payload: bytes) -> bytes:
+    header = RECORD_HEADER.pack(rtype, len(payload))
+    return header + payload + CRC.pack(zlib.crc32(header + payload))
+
+
+def decode_records(buf: bytes) -> tuple[list[tuple[int, bytes]], int]:
+    # stops at the first torn or corrupted record, returns the records and the
+    # length of the valid prefix of buf
+    records = []
+    pos = 0
+    while pos + RECORD_HEADER.size <= len(buf):
+        rtype, n = RECORD_HEADER.unpack_from(buf, pos)
+        end = pos + RECORD_HEADER.size + n
+        if end + CRC.size > len(buf):
+            break
+        (crc,) = CRC.unpack_from(buf, end)
+        if crc != zlib.crc32(buf[pos:end]):
+            break
+        records.append((rtype, buf[pos + RECORD_HEADER.size : end]))
+        pos = end + CRC.size
+    return records, pos
+
+
+class WriteAheadLog:
+    # one segment per stage, so that segments can be dropped as soon as their
+    # stage is in a snapshot
+    def __init__(self, directory: str, fsync=True):
+        self.directory = os.path.join(directory, "wal")
+        os.makedirs(self.directory, exist_ok=True)
+        self.fsync = fsync
+        self.lock = Lock()
+        self.files: dict[int, BinaryIO] = {}
+
+    def path(self, stage_idx: int) -> str:
+        return os.path.join(self.directory, f"{stage_idx:010d}.log")
+
+    def segments(self) -> list[int]:
+        return sorted(
+            int(name[:-4])
+            for name in os.listdir(self.directory)
+            if name.endswith(".log")
+        )
+
+    def append(self, stage_idx: int, rtype: int, payload=b"", sync=False):
+        self.write(stage_idx, encode_record(rtype, payload), sync)
+
+    def write(self, stage_idx: int, records: bytes, sync=False):
+        # every write is flushed to the os, sync also waits for the disk
+        with self.lock:
+            f = self.files.get(stage_idx)
+            if f is None:
+                f = self.files[stage_idx] = open(self.path(stage_idx), "ab")
+            f.write(records)
+            f.flush()
+            if sync and self.fsync:
+                os.fsync(f.fileno())
+
+    def append_contribution(self, stage_idx: int, data_idx: int, x: bytes):
+        self.append(stage_idx, CONTRIBUTE, INDEX.pack(data_idx) + x)
+
+    def append_contributions(self, stage_idx: int, first_idx: int, xs: list[bytes]):
+        # in a single write
+        self.write(
+            stage_idx,
+            b"".join(
+                encode_record(CONTRIBUTE, INDEX.pack(first_idx + i) + x)
+                for i, x in enumerate(xs)
+            ),
+        )
+
+    def close_segment(self, stage_idx: int):
+        with self.lock:
+            f = self.files.pop(stage_idx, None)
+        if f is not None:
+            f.close()
+
+    def replay(self, stage_idx: int) -> list[tuple[int, bytes]]:
+        with open(self.path(stage_idx), "rb") as f:
+            buf = f.read()
+        records, valid = decode_records(buf)
+        if valid < len(buf):
+            # torn write from a crash, drop it so that new records stay readable
+            with open(self.path(stage_idx), "r+b") as f:
+                f.truncate(valid)
+        return records
+
+    def drop(self, last_stage_idx: int):
+        for stage_idx in self.segments():
+            if stage_idx <= last_stage_idx:
+                self.close_segment(stage_idx)
+                os.unlink(self.path(stage_idx))
+
+
+class SnapshotStore:
+    # finalized stages, each chunk snapshot/<first>-<last>.snap is a msgpack list
+    # of Stage.snapshot() states and is written atomically
+    def __init__(self, directory: str):
+        self.directory = os.path.join(directory, "snapshot")
+        os.makedirs(self.directory, exist_ok=True)
+        self.chunks = self.list_chunks()
+
+    def list_chunks(self) -> list[tuple[int, int]]:
+        chunks = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".snap"):
+                first, last = name[:-5].split("-")
+                chunks.append((int(first), int(last)))
+        return sorted(chunks)
+
+    def path(self, first: int, last: int) -> str:
+        return os.path.join(self.directory, f"{first:010d}-{last:010d}.snap")
+
+    @property
+    def last_stage(self) -> int:
+        return self.chunks[-1][1] if self.chunks else -1
+
+    def write(self, first: int, states: list):
+        last = first + len(states) - 1
+        path = self.path(first, last)
+        with open(path + ".tmp", "wb") as f:
+            f.write(msgpack.packb({"version": SNAPSHOT_VERSION, "stages": states}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.chunks.append((first, last))
+
+    def load(self):
+        expected = 0
+        for first, last in self.chunks:
+            if first != expected:
+                raise ValueError(f"missing snapshot of stage {expected}")
+            with open(self.path(first, last), "rb") as f:
+                snapshot = msgpack.unpackb(f.read())
+            if snapshot["version"] != SNAPSHOT_VERSION:
+                raise ValueError("unsupported snapshot version")
+            yield from snapshot["stages"]
+            expected = last + 1
@@ -1,2 +1,7 @@
 #!/bin/sh
-gunicorn -k gevent --bind 0.0.0.0:5000 headstart.server:app
+# a single beacon core owns the stages, the gunicorn workers are stateless
+export HEADSTART_CORE_SOCKET=${HEADSTART_CORE_SOCKET:-/tmp/headstart.sock}
+python -m headstart.core --socket "$HEADSTART_CORE_SOCKET" --state-dir "${HEADSTART_STATE_DIR:-state}" &
+CORE_PID=$!
+trap 'kill $CORE_PID' EXIT INT TERM
+gunicorn -k gevent -w ${WORKERS:-4} --bind 0.0.0.0:5000 headstart.server:app
@@ -0,0 +1,49 @@
+from headstart.acc.merkle_tree import MerkleHash, UnbalancedMerkleTree
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+import os, timeit, multiprocessing
+
+if __name__ == "__main__":
+    H = MerkleHash(sha256)
+    print(f"cpu_count={os.cpu_count()}")
+    for bits in [16, 18, 20, 22]:
+        data = [os.urandom(16) for _ in range(1 << bits)]
+        root = UnbalancedMerkleTree.from_data(H, data).root
+        t_seq = timeit.timeit(lambda: UnbalancedMerkleTree.from_data(H, data), number=1)
+        print(f"2^{bits} leaves: sequential={t_seq}")
+        for workers in [1, 2, 4, 8]:
+            with ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                # warm up the workers
+                assert UnbalancedMerkleTree.from_data(H, data, executor).root == root
+                t = timeit.timeit(
+                    lambda: UnbalancedMerkleTree.from_data(H, data, executor), number=1
+                )
+            print(f"2^{bits} leaves: workers={workers}, t={t}, speedup={t_seq / t:.2f}")
+
+"""
+measured on a single core machine, so this only shows the overhead of shipping the
+chunks to the workers, which stays below ~20% from 2^18 leaves on
+cpu_count=1
+2^16 leaves: sequential=0.16259639800000514
+2^16 leaves: workers=1, t=0.1981236890001128, speedup=0.82
+2^16 leaves: workers=2, t=0.2117876659999638, speedup=0.77
+2^16 leaves: workers=4, t=0.20483561899982305, speedup=0.79
+2^16 leaves: workers=8, t=0.19545018000007985, speedup=0.83
+2^18 leaves: sequential=0.6434425560000818
+2^18 leaves: workers=1, t=0.8217780479999419, speedup=0.78
+2^18 leaves: workers=2, t=0.7140625829999863, speedup=0.90
+2^18 leaves: workers=4, t=0.744038522999972, speedup=0.86
+2^18 leaves: workers=8, t=0.775420049000104, speedup=0.83
+2^20 leaves: sequential=2.7848740500000986
+2^20 leaves: workers=1, t=2.995565170999953, speedup=0.93
+2^20 leaves: workers=2, t=3.1523267299999134, speedup=0.88
+2^20 leaves: workers=4, t=3.250553428000103, speedup=0.86
+2^20 leaves: workers=8, t=3.700809192000179, speedup=0.75
+2^22 leaves: sequential=11.711198573999809
+2^22 leaves: workers=1, t=12.216263474000016, speedup=0.96
+2^22 leaves: workers=2, t=11.496954722000055, speedup=1.02
+2^22 leaves: workers=4, t=13.859097764999888, speedup=0.85
+2^22 leaves: workers=8, t=12.63013865400012, speedup=0.93
+"""
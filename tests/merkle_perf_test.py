@@ -0,0 +1,50 @@
+from headstart.acc.merkle_tree import (
+    MerkleHash,
+    MerkleTree,
+    CompactMerkleTree,
+    UnbalancedMerkleTree,
+)
+from hashlib import sha256
+import os, timeit, tracemalloc, random
+
+H = MerkleHash(sha256)
+bits = 20
+n_proofs = 1 << 16
+data = [os.urandom(16) for _ in range(1 << bits)]
+indices = [random.randrange(1 << bits) for _ in range(n_proofs)]
+
+for cls in [MerkleTree, CompactMerkleTree]:
+    tracemalloc.start()
+    tree = cls.compute_tree(H, data)
+    mem, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mkt = cls(H, tree)
+    t_build = timeit.timeit(lambda: cls.compute_tree(H, data), number=1)
+    t_proof = timeit.timeit(lambda: [mkt.get_proof(i) for i in indices], number=1)
+    print(
+        f"{cls.__name__} with 2^{bits} leaves: memory={mem / 2**20:.1f}MiB, "
+        f"peak={peak / 2**20:.1f}MiB, "
+        f"build={t_build}, proofs/s={n_proofs / t_proof:.0f}"
+    )
+
+
+# 2^k + 1 leaves, the worst case for padding
+data = data[: (1 << bits - 1) + 1]
+for cls in [MerkleTree, CompactMerkleTree, UnbalancedMerkleTree]:
+    tracemalloc.start()
+    mkt = cls.from_data(H, data)
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t_build = timeit.timeit(lambda: cls.from_data(H, data), number=1)
+    print(
+        f"{cls.__name__} with 2^{bits - 1}+1 leaves: memory={mem / 2**20:.1f}MiB, "
+        f"build={t_build}"
+    )
+
+"""
+MerkleTree with 2^20 leaves: memory=146.0MiB, peak=146.0MiB, build=2.679302744999859, proofs/s=101894
+CompactMerkleTree with 2^20 leaves: memory=64.0MiB, peak=185.1MiB, build=1.92718350500013, proofs/s=110254
+MerkleTree with 2^19+1 leaves: memory=154.0MiB, build=4.841450518999864
+CompactMerkleTree with 2^19+1 leaves: memory=72.0MiB, build=3.8351654889997917
+UnbalancedMerkleTree with 2^19+1 leaves: memory=36.0MiB, build=1.0471208999999817
+"""
@@ -0,0 +1,27 @@
+from headstart.receipt import ReceiptSigner
+from concurrent.futures import ThreadPoolExecutor
+import headstart.public_key as public_key
+import os, timeit
+
+priv_key = public_key.Ed25519PrivateKey.generate()
+n = 20000
+data = [os.urandom(32) for _ in range(n)]
+
+for threads in [1, 16, 64]:
+    with ThreadPoolExecutor(threads) as pool:
+        t_single = timeit.timeit(
+            lambda: list(pool.map(lambda x: public_key.sign(priv_key, x), data)),
+            number=1,
+        )
+        signer = ReceiptSigner(priv_key)
+        t_batch = timeit.timeit(lambda: list(pool.map(signer.sign, data)), number=1)
+    print(
+        f"threads={threads}: per-request={n / t_single:.0f}/s, "
+        f"batched={n / t_batch:.0f}/s"
+    )
+
+"""
+threads=1: per-request=9865/s, batched=9315/s
+threads=16: per-request=12630/s, batched=17748/s
+threads=64: per-request=12210/s, batched=19979/s
+"""
@@ -0,0 +1,38 @@
+from headstart.stage import Stage, Parameters
+import os, time, timeit
+
+# latency of closing a stage, i.e. what stop_contribution spends on the tree before
+# the vdf can start, against rebuilding the whole tree at the boundary
+Parameters.vdf_executor.submit_eval = lambda challenge: None
+Stage.vdf_run = lambda self: None
+
+for hash_worker in [False, True]:
+    Parameters.hash_worker = hash_worker
+    for n in [10000, 100000, 1000000]:
+        data = [os.urandom(32) for _ in range(n)]
+        stage = Stage()
+        for x in data:
+            stage.contribute(x)
+        start = time.perf_counter()
+        stage.stop_contribution()
+        t_close = time.perf_counter() - start
+        t_rebuild = timeit.timeit(
+            lambda: Parameters.accumulator.accumulate(stage.data), number=1
+        )
+        print(
+            f"hash_worker={hash_worker}, contributions={n}, close={t_close:.6f}, "
+            f"rebuild={t_rebuild:.6f}, {stage.metrics}"
+        )
+
+"""
+hash_worker=False, contributions=10000, close=0.000341, rebuild=0.022219, StageMetrics(leaf_hash_seconds=0.028616385993927906, close_seconds=2.557400011937716e-05)
+hash_worker=False, contributions=100000, close=0.000302, rebuild=0.223638, StageMetrics(leaf_hash_seconds=0.3044998250077242, close_seconds=3.450200006227533e-05)
+hash_worker=False, contributions=1000000, close=0.000320, rebuild=2.517091, StageMetrics(leaf_hash_seconds=3.59906093196696, close_seconds=3.697800002555596e-05)
+hash_worker=True, contributions=10000, close=0.024542, rebuild=0.027342, StageMetrics(leaf_hash_seconds=0.04211912000346274, close_seconds=0.024184048000051916)
+hash_worker=True, contributions=100000, close=0.208686, rebuild=0.234867, StageMetrics(leaf_hash_seconds=0.3266697800665952, close_seconds=0.2084057849999681)
+hash_worker=True, contributions=1000000, close=2.270604, rebuild=2.765410, StageMetrics(leaf_hash_seconds=3.90710947079765, close_seconds=2.2703473869999016)
+
+the contributions arrive in a single burst here, so the hash worker is still
+draining its queue when the stage closes, spread over a real window it closes like
+the inline hashing
+"""
@@ -0,0 +1,53 @@
+from headstart.beacon import RandomnessBeacon
+from headstart.wal import WriteAheadLog, SnapshotStore, CLOSE, Y, PROOF
+from headstart.stage import Parameters
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+import tempfile, timeit, logging, os
+
+
+def make_history(directory: str, n_stages: int, n_contributions: int, tail: int):
+    # n_stages finalized stages, the last `tail` of them only in the log
+    log = WriteAheadLog(directory, fsync=False)
+    snapshots = SnapshotStore(directory)
+    states = []
+    for stage_idx in range(n_stages):
+        data = [b"DUMMY VALUE"] + [os.urandom(16) for _ in range(n_contributions)]
+        y, proof = os.urandom(100), os.urandom(100)
+        if stage_idx < n_stages - tail:
+            accval = Parameters.accumulator.accumulate(data).root
+            states.append([data, accval, os.urandom(32), y, proof])
+            continue
+        for data_idx, x in enumerate(data[1:], 1):
+            log.append_contribution(stage_idx, data_idx, x)
+        log.append(stage_idx, CLOSE)
+        log.append(stage_idx, Y, y)
+        log.append(stage_idx, PROOF, proof)
+        log.close_segment(stage_idx)
+    for first in range(0, len(states), 10):
+        snapshots.write(first, states[first : first + 10])
+
+
+logger = logging.getLogger("wal_perf_test")
+priv_key = Ed25519PrivateKey.generate()
+K = 3
+n_contributions = 100
+for tail in [10, 100]:
+    for n_stages in [100, 1000, 10000]:
+        with tempfile.TemporaryDirectory() as directory:
+            make_history(directory, n_stages, n_contributions, tail)
+            t = (
+                timeit.timeit(
+                    lambda: RandomnessBeacon(logger, priv_key, directory), number=K
+                )
+                / K
+            )
+        print(f"stages={n_stages}, tail={tail}, contributions={n_contributions}, t={t}")
+
+"""
+stages=100, tail=10, contributions=100, t=0.008161967000016071
+stages=1000, tail=10, contributions=100, t=0.015317768333299378
+stages=10000, tail=10, contributions=100, t=0.17820587266665674
+stages=100, tail=100, contributions=100, t=0.06874907066666462
+stages=1000, tail=100, contributions=100, t=0.06446900433335638
+stages=10000, tail=100, contributions=100, t=0.18253757366665013
+"""